@@ -7,7 +7,9 @@ l'exposition thermique et la vulnérabilité de la population
 import streamlit as st
 import geopandas as gpd
 import pandas as pd
+import numpy as np
 import plotly.express as px
+from matplotlib import colormaps
 from pathlib import Path
 
 # Configuration de la page
@@ -40,101 +42,267 @@ CITY_CENTERS = {
 HEAT_COLORS = ['#fee5d9', '#fcbba1', '#fc9272', '#fb6a4a', '#ef3b2c', '#cb181d', '#99000d']
 RISK_COLORS = ['#ffffcc', '#ffeda0', '#fed976', '#feb24c', '#fd8d3c', '#fc4e2a', '#e31a1c', '#b10026']
 
+# Catégories de heat_score (ordonnées) et multiplicateur de chaleur associé
+HEAT_SCORE_CATEGORIES = ['Low', 'Medium', 'High']
+HEAT_MULTIPLIERS = {'Low': 0, 'Medium': 1, 'High': 2}
 
-@st.cache_data
-def load_city_data(city_name):
+# Couleurs discrètes des catégories de heat_score
+HEAT_SCORE_COLORS = {
+    'High': '#e31a1c',    # Rouge
+    'Medium': '#fd8d3c',  # Orange
+    'Low': '#91cf60'      # Vert
+}
+
+# Métriques proposées sur la carte IRIS (libellé -> colonne)
+MAP_METRIC_OPTIONS = {
+    'Catégorie de chaleur': 'heat_score',
+    'Densité de population': 'population_density',
+    '% personnes âgées (55+)': 'pct_elderly_55',
+    '% personnes âgées (55+) vivant seules': 'pct_elderly_55_alone',
+    'Nombre de personnes âgées (55+) seules': 'elderly_55_plus_alone',
+    'Nombre de personnes âgées (80+) seules': 'elderly_80_plus_alone'
+}
+
+# Indicateurs de risque proposés (libellé -> colonnes et titre)
+RISK_OPTIONS = {
+    'Indicateur de risque (55+ seules)': {
+        'col': 'risk_indicator',
+        'elderly_col': 'elderly_55_plus_alone',
+        'label': 'Indicateur de risque'
+    },
+    'Indicateur de risque extrême (80+ seules)': {
+        'col': 'extreme_risk_indicator',
+        'elderly_col': 'elderly_80_plus_alone',
+        'label': 'Indicateur de risque extrême'
+    }
+}
+
+# Colonnes lues dans le GeoJSON IRIS (pyogrio ignore celles qui sont absentes,
+# comme area_km2 dans les fichiers produits avant son ajout au pipeline)
+IRIS_GEO_COLUMNS = ['code_iris', 'nom_iris', 'nom_com', 'heat_score', 'area_km2']
+
+# Types des colonnes démographiques : IRIS en texte (zéros initiaux), métriques en
+# float64 (valeurs exportées telles quelles dans les CSV téléchargeables)
+ELDERLY_DTYPES = {'IRIS': str}
+
+# Métriques du bandeau de statistiques : (libellé, total, part en chaleur élevée, format, texte)
+STAT_METRICS = [
+    ("IRIS", 'total_iris', 'pct_iris_high_heat', ',', "en zones à chaleur élevée"),
+    ("Population", 'total_pop', 'pct_pop_high_heat', ',.0f', "dans IRIS à chaleur élevée"),
+    ("Personnes âgées (55+)", 'total_elderly_55_alone', 'pct_elderly_55_high_heat', ',.0f', "dans IRIS à chaleur élevée"),
+    ("Personnes âgées (80+)", 'total_elderly_80_alone', 'pct_elderly_80_high_heat', ',.0f', "dans IRIS à chaleur élevée"),
+]
+
+# Colonnes de l'export CSV des scores de risque
+RISK_EXPORT_COLUMNS = [
+    'code_iris', 'nom_iris', 'nom_com',
+    'heat_score', 'heat_multiplier',
+    'elderly_55_plus_alone', 'elderly_80_plus_alone',
+    'risk_indicator', 'extreme_risk_indicator'
+]
+
+# Tolérance de simplification des contours IRIS pour la carte (mètres, Lambert-93)
+MAP_SIMPLIFY_TOLERANCE_M = 5
+
+
+def city_source_files(city_name):
+    """Fichiers sources d'une ville : GeoParquet, GeoJSON (à défaut) et données démographiques"""
+    city_lower = city_name.lower()
+    return (
+        PROCESSED_DATA_DIR / f"{city_lower}_iris_heat_vulnerability.parquet",
+        PROCESSED_DATA_DIR / f"{city_lower}_iris_heat_vulnerability.geojson",
+        PROCESSED_DATA_DIR / f"{city_lower}_iris_elderly_pct.csv"
+    )
+
+
+def city_data_version(city_name):
+    """
+    Version des données d'une ville : dates de modification (ns) de ses fichiers sources
+    Passée à toutes les fonctions mises en cache (données, statistiques, GeoJSON, cartes, CSV),
+    elle fait partie de leur clé : régénérer un fichier de data/processed invalide
+    automatiquement les résultats en cache, y compris ceux persistés sur disque
+    """
+    return tuple(
+        path.stat().st_mtime_ns if path.exists() else None
+        for path in city_source_files(city_name)
+    )
+
+
+@st.cache_data(persist="disk", max_entries=len(CITIES))
+def load_city_data(city_name, data_version):
     """
     Charge et fusionne toutes les données pour une ville
     Retourne un GeoDataFrame avec toutes les métriques
+
+    Le résultat est persisté sur disque (~/.streamlit/cache) pour survivre aux redémarrages ;
+    data_version (voir city_data_version) n'est utilisé que comme clé de cache
     """
-    city_lower = city_name.lower()
+    # Charger le GeoParquet (ou à défaut le GeoJSON) avec les scores de chaleur et la géométrie
+    parquet_file, geojson_file, elderly_file = city_source_files(city_name)
 
-    # Charger le GeoJSON avec les scores de chaleur et la géométrie
-    geojson_file = PROCESSED_DATA_DIR / f"{city_lower}_iris_heat_vulnerability.geojson"
-    elderly_file = PROCESSED_DATA_DIR / f"{city_lower}_iris_elderly_pct.csv"
+    if not (parquet_file.exists() or geojson_file.exists()) or not elderly_file.exists():
+        return None
 
-    if not geojson_file.exists() or not elderly_file.exists():
+    # Charger les données géographiques (GeoParquet bien plus rapide à lire que le GeoJSON,
+    # généré par scripts/convert_processed_to_parquet.py). Le GeoParquet n'est utilisé que
+    # s'il est au moins aussi récent que le GeoJSON : un GeoJSON régénéré seul (notebook)
+    # n'est pas masqué par un GeoParquet périmé
+    use_parquet = parquet_file.exists() and (
+        not geojson_file.exists() or parquet_file.stat().st_mtime >= geojson_file.stat().st_mtime
+    )
+    if use_parquet:
+        iris_geo = gpd.read_parquet(parquet_file, columns=IRIS_GEO_COLUMNS + ['geometry'])
+    else:
+        iris_geo = gpd.read_file(geojson_file, engine='pyogrio', columns=IRIS_GEO_COLUMNS, use_arrow=True)
+
+    # Catégorie ordonnée plutôt que chaînes de caractères
+    iris_geo['heat_score'] = pd.Categorical(iris_geo['heat_score'], categories=HEAT_SCORE_CATEGORIES, ordered=True)
+    # Quelques communes/arrondissements répétés sur des centaines d'IRIS : codes catégoriels
+    iris_geo['nom_com'] = iris_geo['nom_com'].astype('category')
+
+    # Charger les données démographiques (avec dtype pour préserver les zéros initiaux),
+    # indexées par code IRIS (clé unique) pour la jointure ; la colonne IRIS est conservée
+    # (vide pour les IRIS sans données démographiques), comme dans l'export CSV complet
+    elderly_data = pd.read_csv(elderly_file, dtype=ELDERLY_DTYPES).set_index('IRIS', drop=False)
+
+    # Jointure à gauche sur l'index : pas de réindexation
+    combined = iris_geo.join(elderly_data, on='code_iris')
+
+    # Calculer la densité de population. La surface est précalculée par le pipeline
+    # (scripts/process_iris_heat_all_cities.py) ; à défaut, on la calcule en CRS métrique
+    # (EPSG:2154 est Lambert-93, la projection officielle pour la France)
+    if 'area_km2' in combined.columns:
+        # Surface lue avec la géométrie : replacée après les colonnes démographiques,
+        # à la même position que dans les exports CSV d'origine
+        combined['area_km2'] = combined.pop('area_km2')
+    else:
+        combined_projected = combined if combined.crs.to_epsg() == 2154 else combined.to_crs(epsg=2154)
+        combined['area_km2'] = combined_projected.geometry.area / 1_000_000  # Convertir m² en km²
+    combined['population_density'] = combined['total_population'] / combined['area_km2']
+
+    # Calculer les indicateurs de risque en utilisant le heat_score catégoriel
+    # (0 pour un score de chaleur absent ou inconnu)
+    combined['heat_multiplier'] = combined['heat_score'].map(HEAT_MULTIPLIERS).fillna(0).astype(int)
+
+    # Les deux indicateurs en une seule multiplication vectorisée (N, 2) × (N, 1),
+    # effectuée en place dans un unique tableau float64 (pas de tableau intermédiaire)
+    risk_values = combined[['elderly_55_plus_alone', 'elderly_80_plus_alone']].to_numpy(dtype=np.float64, copy=True)
+    risk_values *= combined['heat_multiplier'].to_numpy()[:, np.newaxis]
+    combined[['risk_indicator', 'extreme_risk_indicator']] = risk_values
+
+    return combined
+
+
+@st.cache_data(persist="disk", max_entries=len(CITIES), show_spinner=False)
+def compute_city_statistics(city_name, data_version):
+    """
+    Calcule les statistiques globales d'une ville (totaux et parts en zone de chaleur élevée)
+    Mises en cache par ville et par version des données (voir city_data_version) :
+    elles ne dépendent d'aucun autre widget de la page
+    """
+    city_data = load_city_data(city_name, data_version)
+
+    if city_data is None or len(city_data) == 0:
         return None
 
-    # Charger les données géographiques
-    iris_geo = gpd.read_file(geojson_file)
+    # Travailler sur les attributs seuls : la géométrie n'est pas utile aux statistiques
+    city_df = pd.DataFrame(city_data.drop(columns='geometry'))
+
+    # Effectifs empilés en une matrice (N, 3) float64 :
+    # une seule réduction pour les totaux, une seule pour les zones à chaleur élevée
+    counts = city_df[['total_population', 'elderly_55_plus_alone', 'elderly_80_plus_alone']].to_numpy(dtype=np.float64)
+    high_heat = (city_df['heat_score'] == 'High').to_numpy()
+
+    totals = np.nansum(counts, axis=0)
+    high_heat_totals = np.nansum(counts[high_heat], axis=0)
+    pct_high_heat = np.divide(high_heat_totals, totals, out=np.zeros_like(totals), where=totals > 0) * 100
+
+    total_pop, total_elderly_55_alone, total_elderly_80_alone = totals
+    pct_pop_high_heat, pct_elderly_55_high_heat, pct_elderly_80_high_heat = pct_high_heat
+
+    total_iris = len(city_df)
+    pct_iris_high_heat = (high_heat.sum() / total_iris * 100) if total_iris > 0 else 0
+
+    return {
+        'total_iris': total_iris,
+        'total_pop': total_pop,
+        'total_elderly_55_alone': total_elderly_55_alone,
+        'total_elderly_80_alone': total_elderly_80_alone,
+        'pct_iris_high_heat': pct_iris_high_heat,
+        'pct_pop_high_heat': pct_pop_high_heat,
+        'pct_elderly_55_high_heat': pct_elderly_55_high_heat,
+        'pct_elderly_80_high_heat': pct_elderly_80_high_heat
+    }
 
-    # Charger les données démographiques (avec dtype pour préserver les zéros initiaux)
-    elderly_data = pd.read_csv(elderly_file, dtype={'IRIS': str})
 
-    # S'assurer que les types correspondent pour la fusion
-    iris_geo['code_iris'] = iris_geo['code_iris'].astype(str)
-    elderly_data['IRIS'] = elderly_data['IRIS'].astype(str)
 
-    # Fusionner les ensembles de données
-    combined = iris_geo.merge(
-        elderly_data,
-        left_on='code_iris',
-        right_on='IRIS',
-        how='left'
-    )
 
-    # Calculer la densité de population (projeter d'abord en CRS métrique pour un calcul précis de la surface)
-    # EPSG:2154 est Lambert-93, la projection officielle pour la France
-    combined_projected = combined.to_crs(epsg=2154)
-    combined['area_km2'] = combined_projected.geometry.area / 1_000_000  # Convertir m² en km²
-    combined['population_density'] = combined['total_population'] / combined['area_km2']
+@st.cache_resource(max_entries=len(CITIES), show_spinner=False)
+def load_city_geojson(city_name, data_version):
+    """
+    Géométries IRIS simplifiées d'une ville en EPSG:4326 (WGS84), au format GeoJSON pour mapbox
+    Ne dépend que de la ville (et de la version de ses données) : calculé une fois,
+    quelle que soit la métrique affichée
 
-    # Calculer les indicateurs de risque en utilisant le heat_score catégoriel
-    def calculate_heat_multiplier(heat_score):
-        """Calcule le multiplicateur de chaleur à partir du score de chaleur catégoriel"""
-        if pd.isna(heat_score):
-            return 0
-        elif heat_score == 'Low':
-            return 0
-        elif heat_score == 'Medium':
-            return 1
-        elif heat_score == 'High':
-            return 2
-        else:
-            return 0
-
-    combined['heat_multiplier'] = combined['heat_score'].apply(calculate_heat_multiplier)
-    combined['risk_indicator'] = combined['heat_multiplier'] * combined['elderly_55_plus_alone']
-    combined['extreme_risk_indicator'] = combined['heat_multiplier'] * combined['elderly_80_plus_alone']
+    Mis en cache comme ressource partagée (pas de copie à chaque rerun) : ne pas modifier
+    le dictionnaire retourné. Chaque feature porte l'index de la ligne comme `id` : la
+    version des données fait partie de la clé pour rester aligné avec load_city_data
+    """
+    city_data = load_city_data(city_name, data_version)
 
-    return combined
+    if city_data is None or len(city_data) == 0:
+        return None
+
+    # Simplifier en mètres (Lambert-93) avant la reprojection : invisible au zoom de la
+    # carte, mais divise par ~4 le nombre de sommets envoyés au navigateur.
+    # Sans CRS, les coordonnées sont supposées déjà en WGS84 et utilisées telles quelles
+    # (la tolérance en mètres n'aurait pas de sens)
+    geometry = city_data.geometry
+    if geometry.crs is not None:
+        if geometry.crs.to_epsg() != 2154:
+            geometry = geometry.to_crs(epsg=2154)
+        geometry = geometry.simplify(MAP_SIMPLIFY_TOLERANCE_M, preserve_topology=True)
+        geometry = geometry.to_crs(epsg=4326)
 
+    return geometry.__geo_interface__
 
 
+@st.cache_data(max_entries=len(CITIES), show_spinner=False)
+def build_city_csv(city_name, data_version):
+    """
+    Exports CSV d'une ville (données complètes sans géométrie, et scores de risque seuls)
+    Sérialisés une fois par ville et par version des données plutôt qu'à chaque rerun
+    """
+    city_data = load_city_data(city_name, data_version)
+
+    full_csv = city_data.drop(columns=['geometry']).to_csv(index=False)
+    risk_csv = city_data[RISK_EXPORT_COLUMNS].to_csv(index=False)
 
-def create_plotly_map(city_data, city_center, metric_col, metric_name, colormap='YlOrRd'):
+    return full_csv, risk_csv
+
+
+def create_plotly_map(city_data, city_geojson, city_center, metric_col, metric_name, colormap='YlOrRd'):
     """Créer une carte choroplèthe Plotly mapbox avec des couleurs adaptées au daltonisme"""
 
     if metric_col not in city_data.columns:
         return None
 
-    # Reprojeter en EPSG:4326 (WGS84) pour la compatibilité avec mapbox
-    city_data_map = city_data.copy()
-    if city_data_map.crs is not None and city_data_map.crs.to_epsg() != 4326:
-        city_data_map = city_data_map.to_crs(epsg=4326)
+    # Seules les colonnes de survol et de couleur sont transmises à Plotly (la géométrie
+    # est déjà fournie via city_geojson)
+    plot_df = pd.DataFrame(city_data[['nom_iris', 'nom_com', metric_col]])
 
     # Vérifier s'il s'agit du heat_score catégoriel
     if metric_col == 'heat_score':
-        # Créer une carte de couleurs discrètes pour les catégories de heat_score
-        color_discrete_map = {
-            'High': '#e31a1c',    # Rouge
-            'Medium': '#fd8d3c',  # Orange
-            'Low': '#91cf60'      # Vert
-        }
-
-        # S'assurer que la colonne heat_score a les bonnes catégories
-        category_order = ['Low', 'Medium', 'High']
-
         fig = px.choropleth_mapbox(
-            city_data_map,
-            geojson=city_data_map.geometry.__geo_interface__,
-            locations=city_data_map.index,
+            plot_df,
+            geojson=city_geojson,
+            locations=plot_df.index,
+            featureidkey='id',
             color=metric_col,
             hover_name='nom_iris',
             hover_data={'nom_com': True, metric_col: True},
-            color_discrete_map=color_discrete_map,
-            category_orders={metric_col: category_order},
+            color_discrete_map=HEAT_SCORE_COLORS,
+            category_orders={metric_col: HEAT_SCORE_CATEGORIES},
             mapbox_style='carto-positron',
             center={'lat': city_center['lat'], 'lon': city_center['lon']},
             zoom=city_center['zoom'],
@@ -144,9 +312,10 @@ def create_plotly_map(city_data, city_center, metric_col, metric_name, colormap=
     else:
         # Échelle continue pour les métriques numériques
         fig = px.choropleth_mapbox(
-            city_data_map,
-            geojson=city_data_map.geometry.__geo_interface__,
-            locations=city_data_map.index,
+            plot_df,
+            geojson=city_geojson,
+            locations=plot_df.index,
+            featureidkey='id',
             color=metric_col,
             hover_name='nom_iris',
             hover_data={'nom_com': True, metric_col: ':.2f'},
@@ -166,7 +335,25 @@ def create_plotly_map(city_data, city_center, metric_col, metric_name, colormap=
     return fig
 
 
-def render_map_analysis(selected_city, city_data):
+@st.cache_resource(max_entries=len(CITIES) * (len(MAP_METRIC_OPTIONS) + len(RISK_OPTIONS)), show_spinner=False)
+def build_city_map(city_name, data_version, metric_col, metric_name, colormap='YlOrRd'):
+    """
+    Carte choroplèthe d'une ville pour une métrique, construite une seule fois
+    Un rerun qui ne change ni la ville ni la métrique réutilise la même figure (ne pas la modifier)
+    """
+    city_center = CITY_CENTERS.get(city_name, CITY_CENTERS['Paris'])
+
+    return create_plotly_map(
+        load_city_data(city_name, data_version),
+        load_city_geojson(city_name, data_version),
+        city_center,
+        metric_col,
+        metric_name,
+        colormap=colormap
+    )
+
+
+def render_map_analysis(selected_city, city_data, data_version):
     """Affiche la section d'analyse cartographique"""
     st.markdown(f"### Cartographie interactive de la chaleur et de la démographie pour {selected_city}")
 
@@ -175,35 +362,24 @@ def render_map_analysis(selected_city, city_data):
         return
 
     # Sélecteur de métrique en haut de cette section
-    metric_options = {
-        'Catégorie de chaleur': 'heat_score',
-        'Densité de population': 'population_density',
-        '% personnes âgées (55+)': 'pct_elderly_55',
-        '% personnes âgées (55+) vivant seules': 'pct_elderly_55_alone',
-        'Nombre de personnes âgées (55+) seules': 'elderly_55_plus_alone',
-        'Nombre de personnes âgées (80+) seules': 'elderly_80_plus_alone'
-    }
-
     col_label, col_selector = st.columns([1, 3])
     with col_label:
         st.markdown("**Sélectionner la métrique à visualiser:**")
     with col_selector:
         selected_metric_name = st.selectbox(
             "",
-            options=list(metric_options.keys()),
+            options=list(MAP_METRIC_OPTIONS.keys()),
             index=0,
             key="iris_map_metric",
             label_visibility="collapsed",
             help="Choisissez quelle métrique afficher sur la carte IRIS"
         )
 
-    metric_col = metric_options[selected_metric_name]
+    metric_col = MAP_METRIC_OPTIONS[selected_metric_name]
 
     # Carte
     st.subheader(f"Carte {selected_metric_name} à {selected_city}")
 
-    city_center = CITY_CENTERS.get(selected_city, CITY_CENTERS['Paris'])
-
     # Determine colormap based on metric
     if 'heat' in metric_col.lower():
         colormap = 'YlOrRd'
@@ -214,19 +390,56 @@ def render_map_analysis(selected_city, city_data):
     else:
         colormap = 'YlOrRd'
 
-    plotly_map = create_plotly_map(
-        city_data,
-        city_center,
-        metric_col,
-        selected_metric_name,
-        colormap=colormap
-    )
+    plotly_map = build_city_map(selected_city, data_version, metric_col, selected_metric_name, colormap=colormap)
 
     if plotly_map:
         st.plotly_chart(plotly_map, use_container_width=True)
 
 
-def render_risk_analysis(selected_city, city_data):
+@st.cache_resource(show_spinner=False)
+def gradient_lut(cmap_name):
+    """
+    Table de correspondance d'une palette matplotlib : styles CSS (fond + texte) pour
+    chacune de ses N couleurs, plus une entrée finale pour les valeurs manquantes
+    Calculée une seule fois par palette
+    """
+    cmap = colormaps[cmap_name]
+    rgba = np.vstack([cmap(np.arange(cmap.N)), cmap(np.nan)])
+
+    # Texte clair sur les fonds sombres (luminance relative, même seuil que pandas)
+    rgb = rgba[:, :3]
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    luminance = linear @ np.array([0.2126, 0.7152, 0.0722])
+    hex_colors = ['#%02x%02x%02x' % tuple(c) for c in np.round(rgb * 255).astype(int)]
+
+    return np.array([
+        f"background-color: {color}; color: {'#f1f1f1' if lum < 0.408 else '#000000'}"
+        for color, lum in zip(hex_colors, luminance)
+    ])
+
+
+def background_gradient_css(values, cmap_name):
+    """
+    Styles CSS d'un dégradé de couleur pour une colonne (équivalent de Styler.background_gradient)
+    Chaque valeur est ramenée à un indice de la table précalculée par gradient_lut
+    """
+    lut = gradient_lut(cmap_name)
+    n_colors = len(lut) - 1
+
+    values = np.asarray(values, dtype=float)
+    vmin, vmax = np.nanmin(values), np.nanmax(values)
+    norm = (values - vmin) / (vmax - vmin) if vmax > vmin else np.zeros_like(values)
+
+    # Même discrétisation que matplotlib (troncature, 1.0 ramené sur la dernière couleur) ;
+    # les valeurs manquantes pointent sur la dernière entrée
+    indices = np.full(len(norm), n_colors)
+    valid = ~np.isnan(norm)
+    indices[valid] = np.clip((norm[valid] * n_colors).astype(int), 0, n_colors - 1)
+
+    return lut[indices].tolist()
+
+
+def render_risk_analysis(selected_city, city_data, data_version):
     """Affiche la section d'analyse de risque - Carte et tableau Top 20"""
     st.markdown(f"### Indicateurs de risque basés sur la chaleur pour {selected_city}")
 
@@ -262,48 +475,27 @@ def render_risk_analysis(selected_city, city_data):
         """)
 
     # Sélecteur de métrique de risque en haut de cette section
-    risk_options = {
-        'Indicateur de risque (55+ seules)': {
-            'col': 'risk_indicator',
-            'elderly_col': 'elderly_55_plus_alone',
-            'label': 'Indicateur de risque'
-        },
-        'Indicateur de risque extrême (80+ seules)': {
-            'col': 'extreme_risk_indicator',
-            'elderly_col': 'elderly_80_plus_alone',
-            'label': 'Indicateur de risque extrême'
-        }
-    }
-
     col_label, col_selector = st.columns([1, 3])
     with col_label:
         st.markdown("**Sélectionner l'indicateur de risque à visualiser :**")
     with col_selector:
         selected_risk_name = st.selectbox(
             "",
-            options=list(risk_options.keys()),
+            options=list(RISK_OPTIONS.keys()),
             index=0,
             key="risk_calculator_metric",
             label_visibility="collapsed",
             help="Choisissez l'indicateur de risque à analyser"
         )
 
-    risk_info = risk_options[selected_risk_name]
+    risk_info = RISK_OPTIONS[selected_risk_name]
     risk_col = risk_info['col']
     elderly_col = risk_info['elderly_col']
 
     # Carte de risque
     st.subheader(f"Carte : {selected_risk_name} à {selected_city}")
 
-    city_center = CITY_CENTERS.get(selected_city, CITY_CENTERS['Paris'])
-
-    plotly_map = create_plotly_map(
-        city_data,
-        city_center,
-        risk_col,
-        risk_info['label'],
-        colormap='YlOrRd'
-    )
+    plotly_map = build_city_map(selected_city, data_version, risk_col, risk_info['label'], colormap='YlOrRd')
 
     if plotly_map:
         st.plotly_chart(plotly_map, use_container_width=True)
@@ -312,20 +504,23 @@ def render_risk_analysis(selected_city, city_data):
     st.markdown("---")
     st.subheader(f"Top 20 des zones IRIS par {selected_risk_name}")
 
-    top_20 = city_data.nlargest(20, risk_col)[
+    # Projeter les colonnes avant la sélection partielle pour ne pas transporter la géométrie
+    top_20 = city_data[
         ['nom_iris', 'nom_com', 'heat_score', 'heat_multiplier',
          elderly_col, risk_col]
-    ].reset_index(drop=True)
+    ].nlargest(20, risk_col).reset_index(drop=True)
 
     top_20.columns = ['Nom IRIS', 'Arrondissement', 'Score de chaleur', 'Multiplicateur de chaleur',
                       risk_info['elderly_col'].replace('_', ' ').title(), risk_info['label']]
     top_20.index = top_20.index + 1
 
+    gradient_css = background_gradient_css(
+        top_20[risk_info['label']],
+        'Oranges' if 'risque' in selected_risk_name else 'Reds'
+    )
+
     st.dataframe(
-        top_20.style.background_gradient(
-            subset=[risk_info['label']],
-            cmap='Oranges' if 'risque' in selected_risk_name else 'Reds'
-        ),
+        top_20.style.apply(lambda _: gradient_css, subset=[risk_info['label']]),
         use_container_width=True
     )
 
@@ -352,8 +547,9 @@ def main():
             label_visibility="collapsed"
         )
 
-    # Charger les données pour la ville sélectionnée
-    city_data = load_city_data(selected_city)
+    # Charger les données pour la ville sélectionnée (version lue une fois par rerun)
+    data_version = city_data_version(selected_city)
+    city_data = load_city_data(selected_city, data_version)
 
     st.markdown("---")
 
@@ -363,72 +559,31 @@ def main():
     if city_data is not None and len(city_data) > 0:
         st.subheader("Statistiques")
 
-        # Calculer les valeurs nécessaires
-        total_pop = city_data['total_population'].sum()
-        total_iris = len(city_data)
-        total_elderly_55_alone = city_data['elderly_55_plus_alone'].sum()
-        total_elderly_80_alone = city_data['elderly_80_plus_alone'].sum()
-
-        # Filtrer les zones à score de chaleur élevé
-        high_heat_zones = city_data[city_data['heat_score'] == 'High']
-
-        # Calculer les pourcentages
-        num_high_heat_iris = len(high_heat_zones)
-        pct_iris_high_heat = (num_high_heat_iris / total_iris * 100) if total_iris > 0 else 0
-
-        pop_high_heat = high_heat_zones['total_population'].sum() if len(high_heat_zones) > 0 else 0
-        pct_pop_high_heat = (pop_high_heat / total_pop * 100) if total_pop > 0 else 0
-
-        elderly_55_high_heat = high_heat_zones['elderly_55_plus_alone'].sum() if len(high_heat_zones) > 0 else 0
-        pct_elderly_55_high_heat = (elderly_55_high_heat / total_elderly_55_alone * 100) if total_elderly_55_alone > 0 else 0
-
-        elderly_80_high_heat = high_heat_zones['elderly_80_plus_alone'].sum() if len(high_heat_zones) > 0 else 0
-        pct_elderly_80_high_heat = (elderly_80_high_heat / total_elderly_80_alone * 100) if total_elderly_80_alone > 0 else 0
+        stats = compute_city_statistics(selected_city, data_version)
 
         # Afficher les 4 métriques en une ligne avec st.metric()
-        col1, col2, col3, col4 = st.columns(4)
-
-        with col1:
-            st.metric(label="IRIS", value=f"{total_iris:,}")
-            if pct_iris_high_heat >= 60:
-                st.markdown(f"<span style='color: red;'>🌡️ {pct_iris_high_heat:.1f}% en zones à chaleur élevée</span>", unsafe_allow_html=True)
-            else:
-                st.markdown(f"<span style='color: green;'>{pct_iris_high_heat:.1f}% en zones à chaleur élevée</span>", unsafe_allow_html=True)
-
-        with col2:
-            st.metric(label="Population", value=f"{total_pop:,.0f}")
-            if pct_pop_high_heat >= 60:
-                st.markdown(f"<span style='color: red;'>🌡️ {pct_pop_high_heat:.1f}% dans IRIS à chaleur élevée</span>", unsafe_allow_html=True)
-            else:
-                st.markdown(f"<span style='color: green;'>{pct_pop_high_heat:.1f}% dans IRIS à chaleur élevée</span>", unsafe_allow_html=True)
-
-        with col3:
-            st.metric(label="Personnes âgées (55+)", value=f"{total_elderly_55_alone:,.0f}")
-            if pct_elderly_55_high_heat >= 60:
-                st.markdown(f"<span style='color: red;'>🌡️ {pct_elderly_55_high_heat:.1f}% dans IRIS à chaleur élevée</span>", unsafe_allow_html=True)
-            else:
-                st.markdown(f"<span style='color: green;'>{pct_elderly_55_high_heat:.1f}% dans IRIS à chaleur élevée</span>", unsafe_allow_html=True)
-
-        with col4:
-            st.metric(label="Personnes âgées (80+)", value=f"{total_elderly_80_alone:,.0f}")
-            if pct_elderly_80_high_heat >= 60:
-                st.markdown(f"<span style='color: red;'>🌡️ {pct_elderly_80_high_heat:.1f}% dans IRIS à chaleur élevée</span>", unsafe_allow_html=True)
-            else:
-                st.markdown(f"<span style='color: green;'>{pct_elderly_80_high_heat:.1f}% dans IRIS à chaleur élevée</span>", unsafe_allow_html=True)
+        for col, (label, total_key, pct_key, value_format, share_text) in zip(st.columns(len(STAT_METRICS)), STAT_METRICS):
+            with col:
+                st.metric(label=label, value=format(stats[total_key], value_format))
+                pct = stats[pct_key]
+                if pct >= 60:
+                    st.markdown(f"<span style='color: red;'>🌡️ {pct:.1f}% {share_text}</span>", unsafe_allow_html=True)
+                else:
+                    st.markdown(f"<span style='color: green;'>{pct:.1f}% {share_text}</span>", unsafe_allow_html=True)
 
     st.markdown("---")
 
     # ========================================================================
     # SECTION CARTE IRIS
     # ========================================================================
-    render_map_analysis(selected_city, city_data)
+    render_map_analysis(selected_city, city_data, data_version)
 
     st.markdown("---")
 
     # ========================================================================
     # SECTION CALCULATEUR DE RISQUE
     # ========================================================================
-    render_risk_analysis(selected_city, city_data)
+    render_risk_analysis(selected_city, city_data, data_version)
 
     st.markdown("---")
 
@@ -440,29 +595,18 @@ def main():
 
         col1, col2 = st.columns(2)
 
-        with col1:
-            # Préparer les données CSV (sans géométrie)
-            csv_data = city_data.drop(columns=['geometry']).copy()
-            csv_string = csv_data.to_csv(index=False)
+        full_csv, risk_csv = build_city_csv(selected_city, data_version)
 
+        with col1:
             st.download_button(
                 label="📄 Télécharger l'ensemble de données complet (CSV)",
-                data=csv_string,
+                data=full_csv,
                 file_name=f"{selected_city.lower()}_donnees_risque_chaleur.csv",
                 mime="text/csv",
                 help="Ensemble de données complet avec toutes les métriques"
             )
 
         with col2:
-            # Scores de risque uniquement
-            risk_data = city_data[[
-                'code_iris', 'nom_iris', 'nom_com',
-                'heat_score', 'heat_multiplier',
-                'elderly_55_plus_alone', 'elderly_80_plus_alone',
-                'risk_indicator', 'extreme_risk_indicator'
-            ]].copy()
-            risk_csv = risk_data.to_csv(index=False)
-
             st.download_button(
                 label="⚖️ Télécharger les scores de risque (CSV)",
                 data=risk_csv,
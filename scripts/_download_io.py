@@ -0,0 +1,94 @@
+"""
+Shared HTTP download helpers for the ingest scripts
+
+cached_download revalidates an on-disk copy with its ETag / Last-Modified
+before fetching, so re-running a script doesn't re-download unchanged
+source files. Kept free of config imports so any script can use it.
+"""
+
+import requests
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+import json
+import os
+import shutil
+
+# Copy downloads to disk in 1 MiB chunks
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+def drop_from_page_cache(f):
+    """
+    Hint the kernel that a just-written file won't be re-read soon, so its pages
+    don't evict more useful data from the page cache (no-op where unsupported).
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    f.flush()
+    # Dirty pages are only dropped once written back
+    os.fsync(f.fileno())
+    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+def cached_download(url, destination, read_soon=True):
+    """
+    Download a file unless the copy already on disk is still current.
+
+    The ETag / Last-Modified headers of the last download are kept in a
+    sidecar file (destination + '.etag') and sent back as If-None-Match /
+    If-Modified-Since; on 304 Not Modified the cached file is reused.
+
+    Args:
+        url: URL to download from
+        destination: Path object for where to save file
+        read_soon: False when the file is only stored for later, so it is
+            dropped from the page cache once written
+
+    Returns:
+        True if destination holds an up-to-date copy, False on error
+    """
+    validators_file = destination.with_name(destination.name + '.etag')
+
+    headers = {}
+    if destination.exists() and validators_file.exists():
+        validators = json.loads(validators_file.read_text())
+        if validators.get('ETag'):
+            headers['If-None-Match'] = validators['ETag']
+        if validators.get('Last-Modified'):
+            headers['If-Modified-Since'] = validators['Last-Modified']
+
+    print(f"[{destination.name}] Downloading from {url}...")
+
+    # Write to a temporary name first so an interrupted download never looks cached
+    partial = destination.with_name(destination.name + '.part')
+
+    try:
+        # Context manager: the streamed connection is released on every path (304 included)
+        with requests.get(url, headers=headers, stream=True, timeout=30) as response:
+            if response.status_code == 304:
+                print(f"[{destination.name}] ✅ Up to date, using cached copy\n")
+                return True
+
+            response.raise_for_status()
+
+            # Create parent directory if needed
+            destination.parent.mkdir(parents=True, exist_ok=True)
+
+            # Write file in 1 MiB chunks (decoding any Content-Encoding on the way)
+            with open(partial, 'wb') as f:
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+                if not read_soon:
+                    drop_from_page_cache(f)
+            partial.replace(destination)
+
+            validators_file.write_text(json.dumps({
+                'ETag': response.headers.get('ETag'),
+                'Last-Modified': response.headers.get('Last-Modified')
+            }))
+
+        print(f"[{destination.name}] ✅ Downloaded successfully\n")
+        return True
+
+    except (requests.exceptions.RequestException, Urllib3HTTPError) as e:
+        # Don't leave a half-written download behind
+        partial.unlink(missing_ok=True)
+        print(f"[{destination.name}] ❌ Error downloading: {e}\n")
+        return False
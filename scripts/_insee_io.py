@@ -0,0 +1,51 @@
+"""
+Shared INSEE CSV reader for the ingest scripts
+
+INSEE files are ';'-separated, with geographic codes that must stay strings
+(leading zeros, Corsican 2A/2B). Every script reads them through
+read_insee_csv so they all get the same parser settings: multi-threaded Arrow
+parsing, column pruning and string-pinned code columns.
+"""
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
+
+# Arrow parser block size (1 MiB blocks parsed in parallel)
+INSEE_BLOCK_SIZE = 1 << 20
+
+
+def read_insee_csv(stream, include_columns, string_columns, encoding='utf8', decimal_point='.',
+                   coerce_numeric=False):
+    """Read an INSEE CSV stream (e.g. a ZIP member) into a pandas DataFrame
+
+    Only include_columns are converted; string_columns are kept as strings and
+    every other included column is pinned to float64 (Arrow otherwise infers
+    types from the first block only, and a later non-integer value would fail).
+
+    With coerce_numeric, the numeric columns are read as strings instead and
+    non-numeric cells (e.g. the secrecy marker 's') become NaN rather than
+    failing the whole read.
+    """
+    numeric_columns = [col for col in include_columns if col not in string_columns]
+    numeric_type = pa.string() if coerce_numeric else pa.float64()
+    column_types = {col: numeric_type for col in numeric_columns}
+    column_types.update({col: pa.string() for col in string_columns})
+    table = pacsv.read_csv(
+        stream,
+        read_options=pacsv.ReadOptions(encoding=encoding, block_size=INSEE_BLOCK_SIZE),
+        parse_options=pacsv.ParseOptions(delimiter=';'),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=include_columns,
+            column_types=column_types,
+            decimal_point=decimal_point,
+            strings_can_be_null=True
+        )
+    )
+    df = table.to_pandas(self_destruct=True)
+
+    if coerce_numeric:
+        for col in numeric_columns:
+            df[col] = pd.to_numeric(df[col].str.replace(decimal_point, '.', regex=False), errors='coerce')
+
+    return df
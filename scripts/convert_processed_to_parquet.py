@@ -0,0 +1,58 @@
+"""
+Convert the processed IRIS heat GeoJSON files to GeoParquet
+The app reads the Parquet file when it is at least as recent as the GeoJSON
+(much faster to load) and falls back to the GeoJSON otherwise: re-run this
+script after regenerating a GeoJSON outside the pipeline (e.g. from a notebook).
+
+Usage:
+    python scripts/convert_processed_to_parquet.py
+"""
+
+import geopandas as gpd
+from pathlib import Path
+
+# Configuration
+BASE_DIR = Path(__file__).parent.parent
+PROCESSED_DIR = BASE_DIR / "data" / "processed"
+
+
+def convert_file(geojson_file):
+    """Convert one processed GeoJSON file to GeoParquet next to it"""
+    iris_geo = gpd.read_file(geojson_file, engine='pyogrio', use_arrow=True)
+
+    # Older outputs predate the precomputed area column: add it in Lambert-93
+    if 'area_km2' not in iris_geo.columns:
+        iris_projected = iris_geo if iris_geo.crs.to_epsg() == 2154 else iris_geo.to_crs(epsg=2154)
+        iris_geo['area_km2'] = iris_projected.geometry.area / 1_000_000
+
+    parquet_file = geojson_file.with_suffix('.parquet')
+    iris_geo.to_parquet(parquet_file, index=False)
+
+    size_before = geojson_file.stat().st_size / 1_000_000
+    size_after = parquet_file.stat().st_size / 1_000_000
+    print(f'  ✅ {parquet_file.name} ({size_before:.2f} MB -> {size_after:.2f} MB)')
+
+
+def main():
+    """Convert every processed city GeoJSON"""
+    print('='*70)
+    print('CONVERTING PROCESSED IRIS GEOJSON TO GEOPARQUET')
+    print('='*70)
+
+    geojson_files = sorted(PROCESSED_DIR.glob('*_iris_heat_vulnerability.geojson'))
+    if not geojson_files:
+        print(f'❌ No processed GeoJSON found in {PROCESSED_DIR}')
+        return
+
+    for geojson_file in geojson_files:
+        try:
+            convert_file(geojson_file)
+        except Exception as e:
+            print(f'❌ Error converting {geojson_file.name}: {e}')
+
+    print('\n'+'='*70)
+    print('✅ CONVERSION COMPLETE')
+    print('='*70)
+
+if __name__ == '__main__':
+    main()
@@ -3,13 +3,23 @@ Download LCZ data for new cities (Bordeaux, Nantes, Strasbourg, Nice, Montpellie
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import zipfile
 import shutil
+import tempfile
 
 BASE_DIR = Path(__file__).parent.parent
 LCZ_DIR = BASE_DIR / "data" / "raw" / "lcz"
 
+# Download in 1 MiB chunks; archives up to 256 MiB stay in memory, larger ones spill to a temp file
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+SPOOL_MAX_SIZE = 256 * 1024 * 1024
+
+# All archives come from data.gouv.fr: download them concurrently over one pooled session
+MAX_PARALLEL_DOWNLOADS = 5
+
 CITIES_URLS = {
     'Bordeaux': 'https://www.data.gouv.fr/api/1/datasets/r/621cb2fa-6f0b-4833-bfa0-2b0a48d59275',
     'Nice': 'https://www.data.gouv.fr/api/1/datasets/r/ce71193c-b478-4d85-851c-d34519a9592e',
@@ -18,62 +28,45 @@ CITIES_URLS = {
     'Nantes': 'https://www.data.gouv.fr/api/1/datasets/r/dfe6ad34-28fe-4cd2-a5c5-94573d1b0322'
 }
 
-def download_and_extract_city(city_name, url):
-    """Download and extract LCZ data for a city"""
-    print(f'\n{"="*70}')
-    print(f'Downloading {city_name}...')
-    print(f'{"="*70}')
+def download_and_extract_city(city_name, url, session=requests):
+    """Download and extract LCZ data for a city
 
+    Messages are prefixed with the city name since several downloads run at once.
+    """
     # Create city directory
     city_dir = LCZ_DIR / city_name
     city_dir.mkdir(parents=True, exist_ok=True)
 
     # Download ZIP file
-    zip_path = LCZ_DIR / f"{city_name}.zip"
-    print(f'📥 Downloading from {url}...')
+    print(f'📥 [{city_name}] Downloading from {url}...')
 
     try:
-        response = requests.get(url, stream=True, timeout=300)
+        response = session.get(url, stream=True, timeout=300)
         response.raise_for_status()
 
-        total_size = int(response.headers.get('content-length', 0))
         downloaded = 0
 
-        with open(zip_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        # Spool the archive instead of writing it next to the data and reading it back
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as zip_buffer:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                zip_buffer.write(chunk)
                 downloaded += len(chunk)
-                if total_size > 0:
-                    percent = (downloaded / total_size) * 100
-                    print(f'\r  Progress: {percent:.1f}%', end='', flush=True)
-
-        print(f'\n✅ Downloaded {zip_path.name} ({downloaded / 1024 / 1024:.1f} MB)')
 
-        # Extract ZIP
-        print(f'📦 Extracting to {city_dir.name}/...')
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(city_dir)
+            print(f'✅ [{city_name}] Downloaded archive ({downloaded / 1024 / 1024:.1f} MB)')
 
-        print(f'✅ Extracted successfully')
-
-        # Clean up ZIP file
-        zip_path.unlink()
-        print(f'🗑️  Removed temporary ZIP file')
+            # Extract ZIP
+            zip_buffer.seek(0)
+            with zipfile.ZipFile(zip_buffer, 'r') as zip_ref:
+                zip_ref.extractall(city_dir)
 
         # List extracted files
         files = list(city_dir.glob('*'))
-        print(f'📁 Extracted {len(files)} files:')
-        for f in sorted(files)[:5]:
-            print(f'   - {f.name}')
-        if len(files) > 5:
-            print(f'   ... and {len(files) - 5} more')
+        print(f'📦 [{city_name}] Extracted {len(files)} files to {city_dir.name}/')
 
         return True
 
     except Exception as e:
-        print(f'❌ Error: {e}')
-        if zip_path.exists():
-            zip_path.unlink()
+        print(f'❌ [{city_name}] Error: {e}')
         return False
 
 def main():
@@ -83,9 +76,16 @@ def main():
     print(f'\nTarget directory: {LCZ_DIR}')
     print(f'Cities to download: {len(CITIES_URLS)}')
 
-    results = {}
-    for city_name, url in CITIES_URLS.items():
-        results[city_name] = download_and_extract_city(city_name, url)
+    with requests.Session() as session:
+        adapter = HTTPAdapter(pool_connections=MAX_PARALLEL_DOWNLOADS, pool_maxsize=MAX_PARALLEL_DOWNLOADS)
+        session.mount('https://', adapter)
+
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_DOWNLOADS) as executor:
+            futures = {
+                city_name: executor.submit(download_and_extract_city, city_name, url, session)
+                for city_name, url in CITIES_URLS.items()
+            }
+            results = {city_name: future.result() for city_name, future in futures.items()}
 
     # Summary
     print('\n' + '='*70)
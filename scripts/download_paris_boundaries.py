@@ -23,6 +23,9 @@ PARIS_BOUNDARIES_URL = "https://opendata.paris.fr/api/explore/v2.1/catalog/datas
 
 OUTPUT_FILE = PROCESSED_DATA_DIR / "paris_arrondissements.geojson"
 
+# Property names that may hold the arrondissement number, in order of preference
+ARRONDISSEMENT_CODE_KEYS = ('c_ar', 'code', 'c_arinsee', 'n_sq_ar')
+
 def download_paris_boundaries():
     """Download Paris arrondissement boundaries from Open Data Paris."""
     print("=" * 70)
@@ -50,30 +53,21 @@ def download_paris_boundaries():
         # Process features to add standardized CODGEO
         print("\n🔧 Processing boundaries...")
 
-        features_processed = []
+        # Features are updated in place: no need to rebuild the list
         for feature in geojson_data.get('features', []):
             props = feature.get('properties', {})
 
-            # Try to find arrondissement code
-            code = None
-            for key in ['c_ar', 'code', 'c_arinsee', 'n_sq_ar']:
-                if key in props:
-                    code = props[key]
-                    break
+            # First arrondissement code key present in the properties
+            code = next((props[key] for key in ARRONDISSEMENT_CODE_KEYS if key in props), None)
 
             if code:
                 # Create standardized CODGEO (751XX format)
-                codgeo = f"751{str(code).zfill(2)}"
-                props['CODGEO'] = codgeo
-
-            features_processed.append(feature)
-
-        geojson_data['features'] = features_processed
+                props['CODGEO'] = f"751{str(code).zfill(2)}"
 
-        # Save as GeoJSON
+        # Save as compact GeoJSON (no indentation: the file is read by code, not by hand)
         print(f"\n💾 Saving to: {OUTPUT_FILE}")
         with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(geojson_data, f, ensure_ascii=False, indent=2)
+            json.dump(geojson_data, f, ensure_ascii=False, separators=(',', ':'))
 
         file_size = OUTPUT_FILE.stat().st_size / 1024
         print(f"✅ Saved successfully! Size: {file_size:.1f} KB")
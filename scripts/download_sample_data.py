@@ -6,73 +6,35 @@ Usage:
     python scripts/download_sample_data.py
 """
 
-import requests
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import sys
 
 # Add parent directory to path to import config
 sys.path.append(str(Path(__file__).parent.parent))
 from config import LCZ_DIR, POPULATION_DIR, TEST_CITIES
-
-def download_file(url, destination):
-    """
-    Download a file from URL to destination path.
-    
-    Args:
-        url: URL to download from
-        destination: Path object for where to save file
-    """
-    print(f"Downloading from {url}...")
-    print(f"Saving to {destination}...")
-    
-    try:
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-        
-        # Create parent directory if needed
-        destination.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Write file in chunks
-        with open(destination, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        
-        print(f"✅ Downloaded successfully: {destination.name}\n")
-        return True
-        
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error downloading: {e}\n")
-        return False
+from _download_io import cached_download
 
 def download_lcz_cities_list():
     """
     Download the CSV file listing all available LCZ cities.
     This helps us understand which cities are available.
     """
-    print("\n" + "="*60)
-    print("STEP 1: Downloading list of available cities")
-    print("="*60 + "\n")
-    
     # URL for the CSV listing all cities
     url = "https://www.data.gouv.fr/fr/datasets/r/fb8028d6-8018-40fa-b655-4672e8f6feaf"
     destination = LCZ_DIR / "cities_list.csv"
     
-    return download_file(url, destination)
+    return cached_download(url, destination, read_soon=False)
 
 def download_population_data():
     """
     Download INSEE population data.
     Note: This is a large file (~50MB), so it may take a moment.
     """
-    print("\n" + "="*60)
-    print("STEP 2: Downloading INSEE population data")
-    print("="*60 + "\n")
-    
     url = "https://www.insee.fr/fr/statistiques/fichier/7655475/base-pop-legales-2023.zip"
     destination = POPULATION_DIR / "base-pop-legales-2023.zip"
     
-    print("⚠️  This is a large file (~50MB), please be patient...")
-    return download_file(url, destination)
+    return cached_download(url, destination, read_soon=False)
 
 def print_next_steps():
     """Print instructions for what to do next."""
@@ -109,11 +71,21 @@ def main():
     print("\nThis script will download sample data for the project.")
     print("Note: LCZ shapefiles require manual download from data.gouv.fr\n")
     
-    # Download city list
-    success1 = download_lcz_cities_list()
-    
-    # Download population data
-    success2 = download_population_data()
+    # Both steps run concurrently, so announce them up front; their progress
+    # lines are prefixed with the file name
+    print("\n" + "="*60)
+    print("STEP 1: Downloading list of available cities (cities_list.csv)")
+    print("STEP 2: Downloading INSEE population data (base-pop-legales-2023.zip)")
+    print("="*60 + "\n")
+    print("⚠️  The population data is a large file (~50MB), please be patient...\n")
+    
+    # Download the city list and the population data concurrently
+    # (two independent hosts: the small CSV no longer waits behind the ~50MB archive)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        cities_future = executor.submit(download_lcz_cities_list)
+        population_future = executor.submit(download_population_data)
+        success1 = cities_future.result()
+        success2 = population_future.result()
     
     # Print next steps
     print_next_steps()
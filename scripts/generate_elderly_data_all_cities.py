@@ -10,13 +10,19 @@ This script:
 """
 
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+from pyarrow import csv as pacsv
 from pathlib import Path
 import zipfile
-import io
-from urllib.request import urlopen
+import logging
+from _download_io import cached_download
+from _insee_io import read_insee_csv
 import warnings
 warnings.filterwarnings('ignore')
 
+log = logging.getLogger(__name__)
+
 # Configuration
 BASE_DIR = Path(__file__).parent.parent
 PROCESSED_DIR = BASE_DIR / "data" / "processed"
@@ -35,8 +41,29 @@ CITIES_CONFIG = {
     'Montpellier': {'comm_codes': ['34172']}
 }
 
-# INSEE data URL
+# Lookups built once from CITIES_CONFIG: commune code -> city, department prefix -> city
+COMMUNE_TO_CITY = {
+    code: city_name
+    for city_name, config in CITIES_CONFIG.items()
+    for code in config.get('comm_codes', [])
+}
+DEPT_TO_CITY = {
+    config['dept_prefix']: city_name
+    for city_name, config in CITIES_CONFIG.items()
+    if 'dept_prefix' in config
+}
+
+# INSEE data URL, cached locally between runs (re-downloaded only when INSEE publishes a new file)
 INSEE_URL = 'https://www.insee.fr/fr/statistiques/fichier/8647008/base-ic-couples-familles-menages-2022_csv.zip'
+INSEE_ZIP_FILE = BASE_DIR / "data" / "raw" / "population" / "base-ic-couples-familles-menages-2022_csv.zip"
+
+# Code/label columns kept as strings (leading zeros, e.g. Nice 06088)
+INSEE_STRING_COLUMNS = ['IRIS', 'COM', 'LAB_IRIS']
+
+# Only columns read from the ~150-column INSEE file (the counts used by calculate_elderly_stats)
+INSEE_COLUMNS = INSEE_STRING_COLUMNS + [
+    'P22_POP15P', 'P22_POP5579', 'P22_POP80P', 'P22_POP5579_PSEUL', 'P22_POP80P_PSEUL'
+]
 
 def download_insee_data():
     """Download and load INSEE demographic data"""
@@ -46,10 +73,10 @@ def download_insee_data():
     print(f'\n📥 Downloading from INSEE...')
 
     try:
-        response = urlopen(INSEE_URL)
-        zip_buffer = io.BytesIO(response.read())
+        if not cached_download(INSEE_URL, INSEE_ZIP_FILE):
+            raise RuntimeError('INSEE download failed')
 
-        with zipfile.ZipFile(zip_buffer, 'r') as zip_ref:
+        with zipfile.ZipFile(INSEE_ZIP_FILE, 'r') as zip_ref:
             file_list = zip_ref.namelist()
             print(f'✅ Downloaded! Files in archive: {len(file_list)}')
 
@@ -61,12 +88,10 @@ def download_insee_data():
             csv_file = csv_files[0]
             print(f'📂 Loading: {csv_file}')
 
-            # Read CSV
-            insee_data = pd.read_csv(
-                io.StringIO(zip_ref.read(csv_file).decode('utf-8')),
-                dtype={"IRIS": "string", "COM": "string", "LAB_IRIS": "string"},
-                sep=';'
-            )
+            # Read CSV straight from the (binary) archive member with the
+            # shared Arrow-based INSEE reader
+            with zip_ref.open(csv_file) as csv_stream:
+                insee_data = read_insee_csv(csv_stream, INSEE_COLUMNS, INSEE_STRING_COLUMNS)
 
             print(f'✅ Loaded {len(insee_data):,} records')
             return insee_data
@@ -75,26 +100,18 @@ def download_insee_data():
         print(f'❌ Error downloading INSEE data: {e}')
         return None
 
-def filter_city_data(insee_data, city_name, config):
-    """Filter INSEE data for a specific city"""
-    print(f'\n  Filtering for {city_name}...')
-
-    # Filter by department prefix or commune codes
-    if 'dept_prefix' in config:
-        dept_prefix = config['dept_prefix']
-        city_data = insee_data[insee_data['IRIS'].astype(str).str.startswith(dept_prefix)].copy()
-    elif 'comm_codes' in config:
-        comm_codes = config['comm_codes']
-        # IRIS codes start with commune code
-        city_data = insee_data[
-            insee_data['IRIS'].astype(str).str[:5].isin(comm_codes)
-        ].copy()
-    else:
-        print(f'  ⚠️ No filter configuration for {city_name}')
-        return None
+def assign_cities(insee_data):
+    """Label every IRIS with its city in a single vectorized pass over the codes
 
-    print(f'  ✅ Found {len(city_data):,} IRIS zones')
-    return city_data
+    Returns a Series aligned on insee_data (NaN for IRIS outside the configured cities)
+    """
+    # IRIS codes start with the commune code (5 chars), itself starting with the department
+    iris_codes = insee_data['IRIS'].astype(str)
+    city_labels = iris_codes.str[:5].map(COMMUNE_TO_CITY)
+    for dept_prefix, city_name in DEPT_TO_CITY.items():
+        city_labels = city_labels.mask(city_labels.isna() & iris_codes.str.startswith(dept_prefix), city_name)
+
+    return city_labels
 
 def calculate_elderly_stats(city_data):
     """Calculate elderly population statistics"""
@@ -106,47 +123,41 @@ def calculate_elderly_stats(city_data):
     ELDERLY_55_79_ALONE_COL = 'P22_POP5579_PSEUL'  # 55-79 living alone
     ELDERLY_80_ALONE_COL = 'P22_POP80P_PSEUL'  # 80+ living alone
 
+    # Pull each input column out once as a NumPy array (no index alignment in the arithmetic)
+    total_population = city_data[TOTAL_POP_COL].to_numpy()
+    elderly_55_79 = city_data[ELDERLY_55_79_COL].to_numpy()
+    elderly_80 = city_data[ELDERLY_80_COL].to_numpy()
+    elderly_55_79_alone = city_data[ELDERLY_55_79_ALONE_COL].to_numpy()
+    elderly_80_alone = city_data[ELDERLY_80_ALONE_COL].to_numpy()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Elderly 55+ (55-79 + 80+) and their share of the population
+        elderly_55_plus = elderly_55_79 + elderly_80
+        pct_elderly_55 = np.round(elderly_55_plus / total_population * 100, 2)
+
+        # Elderly 55+ living alone and their share among the elderly population
+        elderly_55_plus_alone = elderly_55_79_alone + elderly_80_alone
+        pct_elderly_55_alone = np.round(elderly_55_plus_alone / elderly_55_plus * 100, 2)
+
     # Create results dataframe
-    results = pd.DataFrame()
-    results['IRIS'] = city_data[IRIS_COL]
-    results['total_population'] = city_data[TOTAL_POP_COL]
-
-    # Calculate elderly 55+ (55-79 + 80+)
-    results['elderly_55_plus'] = (
-        city_data[ELDERLY_55_79_COL] + city_data[ELDERLY_80_COL]
-    )
-
-    # Calculate percentage elderly 55+
-    results['pct_elderly_55'] = (
-        (results['elderly_55_plus'] / results['total_population'] * 100)
-        .round(2)
-    )
-
-    # Calculate elderly 55+ living alone
-    results['elderly_55_plus_alone'] = (
-        city_data[ELDERLY_55_79_ALONE_COL] + city_data[ELDERLY_80_ALONE_COL]
-    )
-
-    # Calculate percentage of elderly living alone (among elderly population)
-    results['pct_elderly_55_alone'] = (
-        (results['elderly_55_plus_alone'] / results['elderly_55_plus'] * 100)
-        .round(2)
-    )
-
-    # Elderly 80+ living alone
-    results['elderly_80_plus_alone'] = city_data[ELDERLY_80_ALONE_COL]
-
-    return results
-
-def process_city(insee_data, city_name, config):
-    """Process elderly data for a single city"""
+    return pd.DataFrame({
+        'IRIS': city_data[IRIS_COL].array,
+        'total_population': total_population,
+        'elderly_55_plus': elderly_55_plus,
+        'pct_elderly_55': pct_elderly_55,
+        'elderly_55_plus_alone': elderly_55_plus_alone,
+        'pct_elderly_55_alone': pct_elderly_55_alone,
+        'elderly_80_plus_alone': elderly_80_alone
+    })
+
+def process_city(city_data, city_name):
+    """Process elderly data for a single city (city_data: the city's INSEE rows)"""
     print(f'\n{"="*70}')
     print(f'Processing {city_name}')
     print(f'{"="*70}')
 
-    # Filter data for city
-    city_data = filter_city_data(insee_data, city_name, config)
-    if city_data is None or len(city_data) == 0:
+    print(f'  ✅ Found {len(city_data):,} IRIS zones')
+    if len(city_data) == 0:
         print(f'  ❌ No data found for {city_name}')
         return False
 
@@ -156,7 +167,8 @@ def process_city(insee_data, city_name, config):
 
     # Save to CSV
     output_file = PROCESSED_DIR / f"{city_name.lower()}_iris_elderly_pct.csv"
-    elderly_stats.to_csv(output_file, index=False)
+    # Arrow's C writer instead of pandas' per-cell Python formatting
+    pacsv.write_csv(pa.Table.from_pandas(elderly_stats, preserve_index=False), str(output_file))
     print(f'  ✅ Saved: {output_file.name}')
 
     # Print summary statistics
@@ -170,6 +182,8 @@ def process_city(insee_data, city_name, config):
 
 def main():
     """Main processing function"""
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
     print('\n' + '='*70)
     print('GENERATING ELDERLY DEMOGRAPHIC DATA FOR ALL CITIES')
     print('='*70)
@@ -180,16 +194,17 @@ def main():
         print('\n❌ Failed to download INSEE data')
         return
 
+    # Split the INSEE rows by city in one pass
+    city_groups = dict(iter(insee_data.groupby(assign_cities(insee_data), sort=False)))
+
     # Process each city
     results = {}
-    for city_name, config in CITIES_CONFIG.items():
+    for city_name in CITIES_CONFIG:
         try:
-            success = process_city(insee_data, city_name, config)
+            success = process_city(city_groups.get(city_name, insee_data.iloc[:0]), city_name)
             results[city_name] = success
         except Exception as e:
-            print(f'\n❌ Error processing {city_name}: {e}')
-            import traceback
-            traceback.print_exc()
+            log.exception('\n❌ Error processing %s: %s', city_name, e)
             results[city_name] = False
 
     # Summary
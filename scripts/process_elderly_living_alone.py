@@ -17,20 +17,54 @@ Usage:
 import sys
 from pathlib import Path
 import zipfile
+import csv
+import io
+import logging
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config import RAW_DATA_DIR, PROCESSED_DATA_DIR
+from _insee_io import read_insee_csv
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+from pyarrow import csv as pacsv
+
+log = logging.getLogger(__name__)
 
 # Input file path
 INSEE_ZIP_FILE = RAW_DATA_DIR / "population" / "TD_POP4_2020_csv.zip"
 OUTPUT_FILE = PROCESSED_DATA_DIR / "paris_elderly_living_alone.csv"
 
+# TD_POP4 CSV encoding
+INSEE_ENCODING = 'latin1'
+
+# Paris arrondissement commune codes (75101-75120)
+PARIS_CODES = frozenset(f"751{i:02d}" for i in range(1, 21))
+
+def find_elderly_columns(columns):
+    """
+    Find the 65+ living alone and total 65+ columns among INSEE column names.
+
+    Returns (elderly_alone_col, elderly_total_col), None where nothing matches.
+    """
+    # Upper-case every column name once, then run both pattern searches on it
+    upper_cols = [(col, col.upper()) for col in columns]
+
+    # First 65+ living alone column, first total 65+ column
+    elderly_alone_col = next(
+        (col for col, upper in upper_cols if ('65' in upper or 'PM' in upper) and 'SEUL' in upper),
+        None
+    )
+    elderly_total_col = next(
+        (col for col, upper in upper_cols if ('P65' in upper or 'PM65' in upper) and 'SEUL' not in upper),
+        None
+    )
+    return elderly_alone_col, elderly_total_col
+
 def extract_and_load_csv(zip_path):
-    """Extract CSV from ZIP and load it."""
+    """Extract CSV from ZIP and load it (only CODGEO and the elderly columns)."""
     print(f"📂 Extracting {zip_path.name}...")
 
     with zipfile.ZipFile(zip_path, 'r') as zip_ref:
@@ -47,14 +81,20 @@ def extract_and_load_csv(zip_path):
         csv_file = csv_files[0]
         print(f"   Loading {csv_file}...")
 
-        # Read CSV with proper encoding (INSEE uses latin1 or cp1252)
+        # Read CSV with the INSEE encoding, using the multi-threaded Arrow parser;
+        # CODGEO stays a string (e.g. 2A004, 06088). latin1 maps every byte, so
+        # decoding cannot fail and no fallback encoding is needed. Decimal commas
+        # and non-numeric cells (secrecy markers) are handled by the reader.
+        # First pass on the header only: pick the columns we need, so the
+        # parser skips converting the dozens of other household columns
+        with zip_ref.open(csv_file) as f:
+            header = next(csv.reader(io.TextIOWrapper(f, encoding=INSEE_ENCODING), delimiter=';'))
+        needed_cols = ['CODGEO'] + [col for col in find_elderly_columns(header) if col]
+        print(f"   Reading {len(needed_cols)} of {len(header)} columns: {needed_cols}")
+
         with zip_ref.open(csv_file) as f:
-            try:
-                df = pd.read_csv(f, sep=';', encoding='latin1', low_memory=False)
-            except:
-                # Try alternative encoding
-                f.seek(0)
-                df = pd.read_csv(f, sep=';', encoding='cp1252', low_memory=False)
+            df = read_insee_csv(f, needed_cols, ['CODGEO'], encoding=INSEE_ENCODING, decimal_point=',',
+                                coerce_numeric=True)
 
         return df
 
@@ -81,13 +121,7 @@ def process_elderly_living_alone_data(df):
 
     # Filter for Paris arrondissements (codes 75101-75120)
     print("\n🗼 Filtering Paris arrondissements...")
-    paris_codes = [f"751{str(i).zfill(2)}" for i in range(1, 21)]
-    paris_df = df[df['CODGEO'].isin(paris_codes)].copy()
-
-    if len(paris_df) == 0:
-        # Try without leading zero
-        paris_codes_alt = [f"75{i}" for i in range(101, 121)]
-        paris_df = df[df['CODGEO'].isin(paris_codes_alt)].copy()
+    paris_df = df[df['CODGEO'].isin(PARIS_CODES)]  # read-only below: no copy needed
 
     print(f"   Found {len(paris_df)} arrondissements")
 
@@ -102,53 +136,35 @@ def process_elderly_living_alone_data(df):
     # - PSEUL: People living alone
     # - PM65P_PSEUL: People 65+ living alone
 
-    elderly_cols = [col for col in df.columns if '65' in col.upper() or 'PM' in col.upper()]
-    alone_cols = [col for col in df.columns if 'SEUL' in col.upper()]
+    upper_cols = [(col, col.upper()) for col in df.columns]
+    elderly_cols = [col for col, upper in upper_cols if '65' in upper or 'PM' in upper]
+    alone_cols = [col for col, upper in upper_cols if 'SEUL' in upper]
 
     print(f"\n🔍 Identified columns:")
     print(f"   Elderly-related: {elderly_cols[:5]}")
     print(f"   Living alone-related: {alone_cols[:5]}")
 
-    # Try to find the exact columns we need
-    # Look for columns matching elderly living alone pattern
-    elderly_alone_col = None
-    elderly_total_col = None
-
-    for col in df.columns:
-        col_upper = col.upper()
-        # Look for 65+ living alone
-        if ('65' in col_upper or 'PM' in col_upper) and 'SEUL' in col_upper:
-            elderly_alone_col = col
-            print(f"   ✓ Found elderly living alone: {col}")
-            break
-
-    for col in df.columns:
-        col_upper = col.upper()
-        # Look for total 65+
-        if ('P65' in col_upper or 'PM65' in col_upper) and 'SEUL' not in col_upper:
-            elderly_total_col = col
-            print(f"   ✓ Found elderly total: {col}")
-            break
+    # Find the exact columns we need
+    elderly_alone_col, elderly_total_col = find_elderly_columns(df.columns)
+    if elderly_alone_col:
+        print(f"   ✓ Found elderly living alone: {elderly_alone_col}")
+    if elderly_total_col:
+        print(f"   ✓ Found elderly total: {elderly_total_col}")
 
     # Create output dataframe
     result = pd.DataFrame()
     result['CODGEO'] = paris_df['CODGEO'].values
 
-    # Extract numeric values (INSEE uses string format sometimes)
+    # Counts are already numeric: the reader parses decimal commas and turns
+    # non-numeric cells into NaN
     if elderly_alone_col:
-        result['elderly_living_alone'] = pd.to_numeric(
-            paris_df[elderly_alone_col].astype(str).str.replace(',', '.'),
-            errors='coerce'
-        )
+        result['elderly_living_alone'] = paris_df[elderly_alone_col]
     else:
         print("\n⚠️  Could not find elderly living alone column")
         result['elderly_living_alone'] = np.nan
 
     if elderly_total_col:
-        result['elderly_total'] = pd.to_numeric(
-            paris_df[elderly_total_col].astype(str).str.replace(',', '.'),
-            errors='coerce'
-        )
+        result['elderly_total'] = paris_df[elderly_total_col]
     else:
         print("\n⚠️  Could not find elderly total column")
         result['elderly_total'] = np.nan
@@ -160,9 +176,7 @@ def process_elderly_living_alone_data(df):
 
     # Calculate isolation vulnerability score (0-10 scale)
     # Higher percentage of elderly living alone = higher vulnerability
-    result['isolation_vulnerability'] = result['pct_elderly_living_alone'].apply(
-        lambda x: calculate_isolation_score(x) if pd.notna(x) else np.nan
-    )
+    result['isolation_vulnerability'] = calculate_isolation_score(result['pct_elderly_living_alone'])
 
     return result
 
@@ -176,20 +190,19 @@ def calculate_isolation_score(pct_elderly_alone):
     - 30-40%: Score 5-6 (Moderate isolation)
     - 40-50%: Score 7-8 (High isolation)
     - 50%+: Score 9-10 (Very High isolation)
+
+    Vectorized: takes a scalar or an array/Series of percentages, NaN stays NaN.
     """
-    if pd.isna(pct_elderly_alone):
-        return np.nan
-
-    if pct_elderly_alone < 20:
-        return 1 + (pct_elderly_alone / 20)
-    elif pct_elderly_alone < 30:
-        return 3 + ((pct_elderly_alone - 20) / 10)
-    elif pct_elderly_alone < 40:
-        return 5 + ((pct_elderly_alone - 30) / 10)
-    elif pct_elderly_alone < 50:
-        return 7 + ((pct_elderly_alone - 40) / 10)
-    else:
-        return min(10, 9 + ((pct_elderly_alone - 50) / 50))
+    pct = np.asarray(pct_elderly_alone, dtype=float)
+
+    # Bands are tested in order, as in an if/elif ladder (NaN falls through to the default)
+    score = np.select(
+        [pct < 20, pct < 30, pct < 40, pct < 50],
+        [1 + (pct / 20), 3 + ((pct - 20) / 10), 5 + ((pct - 30) / 10), 7 + ((pct - 40) / 10)],
+        default=np.minimum(10, 9 + ((pct - 50) / 50))
+    )
+
+    return np.where(np.isnan(pct), np.nan, score)
 
 def merge_with_existing_vulnerability(new_data):
     """Merge with existing vulnerability data."""
@@ -217,6 +230,8 @@ def merge_with_existing_vulnerability(new_data):
 
 def main():
     """Main processing function."""
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
     print("=" * 70)
     print("PROCESSING INSEE ELDERLY LIVING ALONE DATA")
     print("=" * 70)
@@ -240,16 +255,16 @@ def main():
         # Merge with existing data
         final = merge_with_existing_vulnerability(processed)
 
-        # Save results
+        # Save results (Arrow's C CSV writer instead of pandas' per-cell formatting)
         print(f"\n💾 Saving results to: {OUTPUT_FILE}")
 
         # Also update the main vulnerability file
         vulnerability_file = PROCESSED_DATA_DIR / "paris_vulnerability.csv"
-        final.to_csv(vulnerability_file, index=False)
+        pacsv.write_csv(pa.Table.from_pandas(final, preserve_index=False), str(vulnerability_file))
         print(f"💾 Updated: {vulnerability_file}")
 
         # Save separate file for elderly living alone data
-        processed.to_csv(OUTPUT_FILE, index=False)
+        pacsv.write_csv(pa.Table.from_pandas(processed, preserve_index=False), str(OUTPUT_FILE))
         print(f"💾 Saved: {OUTPUT_FILE}")
 
         # Display summary
@@ -271,9 +286,7 @@ def main():
         return True
 
     except Exception as e:
-        print(f"\n❌ Error during processing: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("\n❌ Error during processing: %s", e)
         return False
 
 if __name__ == "__main__":
@@ -9,7 +9,17 @@ Data Sources:
 
 import geopandas as gpd
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+from pyarrow import csv as pacsv
+import pyogrio
+import shapely
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import os
+import traceback
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -17,10 +27,26 @@ warnings.filterwarnings('ignore')
 BASE_DIR = Path(__file__).parent.parent
 RAW_LCZ_DIR = BASE_DIR / "data" / "raw" / "lcz"
 PROCESSED_DIR = BASE_DIR / "data" / "processed"
+LCZ_CACHE_DIR = BASE_DIR / "data" / "cache" / "lcz"
 
 # IRIS boundaries GeoPackage
 IRIS_GPKG = BASE_DIR / "data" / "raw" / "iris" / "IRIS-GE_3-0__GPKG_LAMB93_FXX_2025-01-01" / "IRIS-GE" / "1_DONNEES_LIVRAISON_2025-06-00081" / "IRIS-GE_3-0_GPKG_LAMB93_FXX-ED2025-01-01" / "iris.gpkg"
 
+# Cities processed at the same time (one worker process each)
+MAX_PARALLEL_CITIES = 5
+
+# Possible names of the commune code column in the IRIS layer
+COMMUNE_CODE_COLUMNS = ['code_insee', 'insee_com', 'CODE_COMMUNE', 'code_commune', 'INSEE_COM', 'COM']
+
+# IRIS attributes used by the outputs, under their possible names (names missing from the layer are skipped)
+IRIS_COLUMNS = ['code_iris', 'CODE_IRIS', 'nom_iris', 'NOM_IRIS', 'nom_com', 'NOM_COM', 'nom_commune']
+
+# Canonical IRIS column names, applied after lower-casing the layer's column names
+IRIS_COLUMN_RENAMES = {'nom_commune': 'nom_com'}
+
+# Columns of the processed outputs (nom_iris / nom_com only when the IRIS layer has them)
+OUTPUT_COLUMNS = ['code_iris', 'nom_iris', 'nom_com', 'heat_score', 'area_km2', 'geometry']
+
 # Cities configuration
 CITIES_CONFIG = {
     'Paris': {
@@ -75,194 +101,192 @@ CITIES_CONFIG = {
     }
 }
 
-# New heat score classification
-def calculate_heat_score(lcz_class):
-    """
-    Calculate categorical heat score based on LCZ class.
+# Categorical heat score by LCZ class (string form, handles both numeric and string LCZ classes)
+# High heat retention: 1, 2, 3, 8, 10 - Medium: 4, 5, 6, 7, E
+# Any class missing from the map is Low heat: 9, A, B, C, D, F, G, and any others
+HEAT_SCORE_MAP = {
+    **{lcz_class: 'High' for lcz_class in ['1', '2', '3', '8', '10']},
+    **{lcz_class: 'Medium' for lcz_class in ['4', '5', '6', '7', 'E']}
+}
 
-    Parameters:
-    - lcz_class: The Local Climate Zone class identifier (can be int or string)
+# Heat score categories in alphabetical order (ties in the per-IRIS mode go to the first one)
+HEAT_SCORE_CATEGORIES = ['High', 'Low', 'Medium']
 
-    Returns:
-    - str: 'High', 'Medium', or 'Low'
+def find_commune_column():
     """
-    # Convert to string for comparison (handles both numeric and string LCZ classes)
-    lcz_str = str(lcz_class)
-
-    # High heat retention zones
-    high_classes = ['1', '2', '3', '8', '10']
-    # Medium heat retention zones
-    medium_classes = ['4', '5', '6', '7', 'E']
-
-    if lcz_str in high_classes:
-        return 'High'
-    elif lcz_str in medium_classes:
-        return 'Medium'
-    else:
-        # Low heat: 9, A, B, C, D, F, G, and any others
-        return 'Low'
-
-def load_iris_boundaries():
-    """
-    Load IRIS boundaries from GeoPackage
-    Source: IGN IRIS GE - https://geoservices.ign.fr/irisge
-    """
-    print(f'📥 Loading IRIS boundaries from {IRIS_GPKG.name}...')
+    Find the commune code column of the IRIS GeoPackage
+    Reads the layer schema only (no features)
 
-    if not IRIS_GPKG.exists():
-        print(f'❌ IRIS GeoPackage not found at {IRIS_GPKG}')
-        return None
+    Returns (column name, whether it is stored as integers), (None, False) if not found
+    """
+    layer_info = pyogrio.read_info(IRIS_GPKG)
+    fields = layer_info['fields'].tolist()
+    print(f'📋 Available columns: {fields}')
 
-    iris = gpd.read_file(IRIS_GPKG)
-    print(f'✅ Loaded {len(iris):,} total IRIS zones')
-    print(f'📋 Available columns: {iris.columns.tolist()}')
-    print(f'📋 Sample data:')
-    print(iris.head(2))
-    return iris
+    com_col = next((col for col in COMMUNE_CODE_COLUMNS if col in fields), None)
+    if com_col is None:
+        return None, False
+    com_dtype = layer_info['dtypes'][fields.index(com_col)]
+    return com_col, np.issubdtype(np.dtype(com_dtype), np.integer)
 
-def filter_iris_for_city(iris_data, city_name, config):
-    """Filter IRIS boundaries for a specific city"""
+def load_city_iris(city_name, config, com_col, com_is_int):
+    """
+    Load the IRIS boundaries of a specific city
+    Source: IGN IRIS GE - https://geoservices.ign.fr/irisge
+    The commune filter is pushed down to GDAL, so only the city's IRIS are read
+    """
     com_codes = config['com_codes']
 
     print(f'  Looking for commune codes: {com_codes[:5]}...' if len(com_codes) > 5 else f'  Looking for commune codes: {com_codes}')
-
-    # Check for commune code column (try different possible names)
-    com_col = None
-    for possible_col in ['code_insee', 'insee_com', 'CODE_COMMUNE', 'code_commune', 'INSEE_COM', 'COM']:
-        if possible_col in iris_data.columns:
-            com_col = possible_col
-            break
-
-    if com_col is None:
-        print(f'  ⚠️ No commune code column found. Available columns: {iris_data.columns.tolist()}')
-        return None
-
     print(f'  Using column: {com_col}')
-    print(f'  Sample values: {iris_data[com_col].head(10).tolist()}')
 
-    # Convert com_codes to integers for comparison (commune codes might be stored as float/int)
-    com_codes_int = [int(code) for code in com_codes]
+    # Literals typed like the column (schema read once), so the filter is a single typed comparison
+    com_literals = [str(int(code)) for code in com_codes] if com_is_int else [f"'{code}'" for code in com_codes]
+    where = f"{com_col} IN ({', '.join(com_literals)})"
+    # The commune column used in the filter must be selected too
+    city_iris = gpd.read_file(IRIS_GPKG, engine='pyogrio', columns=IRIS_COLUMNS + [com_col], where=where)
 
-    # Filter by commune code
-    city_iris = iris_data[iris_data[com_col].isin(com_codes_int)].copy()
-    if len(city_iris) == 0:
-        # Also try as strings
-        city_iris = iris_data[iris_data[com_col].isin(com_codes)].copy()
+    # Normalize the schema once: lower-case names, then the canonical names used downstream
+    city_iris.columns = city_iris.columns.str.lower()
+    city_iris = city_iris.rename(columns=IRIS_COLUMN_RENAMES)
 
     print(f'  {city_name}: {len(city_iris):,} IRIS zones')
     return city_iris
 
-def process_city(city_name, config, iris_all):
+def load_city_lcz(city_name, config):
+    """
+    Load the LCZ zones of a specific city (LCZ class and geometry)
+    The shapefile is converted once to a GeoParquet cache, read instead on later runs
+    (the cache is rebuilt whenever the shapefile is newer)
+    """
+    lcz_path = RAW_LCZ_DIR / config['lcz_shapefile']
+    cache_file = LCZ_CACHE_DIR / f"{city_name.lower()}_lcz.parquet"
+
+    if cache_file.exists() and cache_file.stat().st_mtime >= lcz_path.stat().st_mtime:
+        print(f'  Loading LCZ data from cache {cache_file.name}...')
+        return gpd.read_parquet(cache_file)
+
+    print(f'  Loading LCZ data from {lcz_path.name}...')
+    lcz_data = gpd.read_file(lcz_path, engine='pyogrio', columns=['lcz'])
+    LCZ_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so an interrupted run never leaves a truncated cache behind
+    tmp_file = cache_file.with_suffix('.parquet.tmp')
+    lcz_data.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, cache_file)
+    return lcz_data
+
+def process_city(city_name, config, com_col, com_is_int):
     """Process LCZ and IRIS data for a city"""
     print(f'\n{"="*70}')
     print(f'Processing {city_name}')
     print(f'{"="*70}')
 
-    # Filter IRIS for city
-    city_iris = filter_iris_for_city(iris_all, city_name, config)
-    if city_iris is None or len(city_iris) == 0:
+    # Load the city's IRIS only
+    city_iris = load_city_iris(city_name, config, com_col, com_is_int)
+    if len(city_iris) == 0:
         print(f'❌ No IRIS zones found for {city_name}')
         return
 
-    # Load LCZ shapefile
-    lcz_path = RAW_LCZ_DIR / config['lcz_shapefile']
-    print(f'  Loading LCZ data from {lcz_path.name}...')
-    lcz_data = gpd.read_file(lcz_path)
+    # Load LCZ zones
+    lcz_data = load_city_lcz(city_name, config)
     print(f'  ✅ Loaded {len(lcz_data):,} LCZ zones')
 
-    # Add categorical heat scores (High/Medium/Low)
-    lcz_data['heat_score'] = lcz_data['lcz'].apply(calculate_heat_score)
+    # Categorical heat scores (High/Medium/Low), kept as a plain array next to the centroids below
+    lcz_heat_scores = lcz_data['lcz'].astype(str).map(HEAT_SCORE_MAP).fillna('Low').to_numpy()
 
-    # Ensure same CRS
-    if lcz_data.crs != city_iris.crs:
+    # Ensure same CRS (compare EPSG codes: a shapefile .prj and the GPKG describe Lambert-93 differently)
+    lcz_epsg = lcz_data.crs.to_epsg()
+    if lcz_epsg is None or lcz_epsg != city_iris.crs.to_epsg():
         print(f'  🔄 Reprojecting LCZ data to match IRIS CRS...')
         lcz_data = lcz_data.to_crs(city_iris.crs)
 
+    if 'code_iris' not in city_iris.columns:
+        print(f"⚠️ Could not find IRIS identifier column. Columns: {city_iris.columns.tolist()}")
+        return
+
     print(f'  🔗 Performing centroid-based spatial join (this may take a while)...')
-    # Create a copy with centroids for accurate IRIS assignment
+    # Use LCZ centroids for accurate IRIS assignment
     # This ensures each LCZ zone is assigned to exactly one IRIS (the one containing its centroid)
-    lcz_centroids = lcz_data.copy()
-    lcz_centroids['geometry'] = lcz_centroids.geometry.centroid
+    # (vectorized GEOS call over the geometry array, no GeoSeries or frame copy)
+    lcz_centroids = shapely.centroid(lcz_data.geometry.to_numpy())
 
-    # Spatial join: assign each LCZ zone to the IRIS that contains its centroid
-    lcz_with_iris = gpd.sjoin(lcz_centroids, city_iris, how='inner', predicate='within')
+    # Only the heat score and centroid arrays are used from here on: release the LCZ polygons
+    del lcz_data
 
-    # Restore original LCZ data (we only needed centroids for the join)
-    # Keep the IRIS assignment but use original heat_score
-    print(f'  ✅ Assigned {len(lcz_with_iris):,} LCZ zones to IRIS (by centroid)')
+    # Spatial index query: (IRIS position, LCZ position) pairs where the IRIS contains the LCZ centroid
+    # The index is built on the centroids and queried with the (far fewer) IRIS polygons
+    # Only the IRIS code is needed, so no joined frame is built
+    centroid_tree = shapely.STRtree(lcz_centroids)
+    iris_idx, lcz_idx = centroid_tree.query(city_iris.geometry.values, predicate='contains')
+    lcz_iris_codes = city_iris['code_iris'].to_numpy()[iris_idx]
+    lcz_heat_scores = lcz_heat_scores[lcz_idx]
+    print(f'  ✅ Assigned {len(lcz_iris_codes):,} LCZ zones to IRIS (by centroid)')
 
     print(f'  📊 Aggregating heat scores by IRIS...')
-    # Aggregate heat scores by IRIS
-    # Get IRIS identifier column
-    iris_col = 'CODE_IRIS' if 'CODE_IRIS' in lcz_with_iris.columns else 'code_iris'
-    if iris_col not in lcz_with_iris.columns:
-        # Try to find it in the joined columns
-        iris_cols = [col for col in lcz_with_iris.columns if 'iris' in col.lower()]
-        if iris_cols:
-            iris_col = iris_cols[0]
-        else:
-            print(f"⚠️ Could not find IRIS identifier column. Columns: {lcz_with_iris.columns.tolist()}")
-            return
-
-    # Calculate most common heat score category per IRIS (mode)
-    heat_by_iris = lcz_with_iris.groupby(iris_col)['heat_score'].agg(
-        lambda x: x.mode()[0] if not x.mode().empty else 'Low'
-    ).reset_index()
-    heat_by_iris.columns = ['code_iris', 'heat_score']
-
-    # Merge back with IRIS geometries
-    iris_col_original = 'CODE_IRIS' if 'CODE_IRIS' in city_iris.columns else 'code_iris'
-    city_iris_with_heat = city_iris.merge(heat_by_iris, left_on=iris_col_original, right_on='code_iris', how='left')
-
-    # Clean up column names
-    if 'CODE_IRIS' in city_iris_with_heat.columns:
-        city_iris_with_heat['code_iris'] = city_iris_with_heat['CODE_IRIS']
-
-    # Ensure we have essential columns
-    essential_cols = []
-    if 'code_iris' in city_iris_with_heat.columns:
-        essential_cols.append('code_iris')
-    elif 'CODE_IRIS' in city_iris_with_heat.columns:
-        city_iris_with_heat['code_iris'] = city_iris_with_heat['CODE_IRIS']
-        essential_cols.append('code_iris')
-
-    if 'nom_iris' not in city_iris_with_heat.columns and 'NOM_IRIS' in city_iris_with_heat.columns:
-        city_iris_with_heat['nom_iris'] = city_iris_with_heat['NOM_IRIS']
-    if 'nom_iris' in city_iris_with_heat.columns:
-        essential_cols.append('nom_iris')
-
-    # Handle commune name column (various possible names)
-    if 'nom_com' not in city_iris_with_heat.columns:
-        if 'NOM_COM' in city_iris_with_heat.columns:
-            city_iris_with_heat['nom_com'] = city_iris_with_heat['NOM_COM']
-        elif 'nom_commune' in city_iris_with_heat.columns:
-            city_iris_with_heat['nom_com'] = city_iris_with_heat['nom_commune']
-    if 'nom_com' in city_iris_with_heat.columns:
-        essential_cols.append('nom_com')
-
-    essential_cols.extend(['heat_score', 'geometry'])
-
-    # Keep only essential columns that exist
-    cols_to_keep = [col for col in essential_cols if col in city_iris_with_heat.columns]
-    city_iris_final = city_iris_with_heat[cols_to_keep]
+    # Calculate most common heat score category per IRIS (mode) from an (IRIS x category) count table
+    # Only IRIS that received LCZ zones get a row; argmax breaks ties towards the first
+    # category in HEAT_SCORE_CATEGORIES (alphabetical order, as with mode())
+    iris_codes, iris_uniques = pd.factorize(lcz_iris_codes)
+    heat_codes = pd.Categorical(lcz_heat_scores, categories=HEAT_SCORE_CATEGORIES).codes
+    # Single bincount over the flattened (IRIS, category) cell index, reshaped into the table
+    n_categories = len(HEAT_SCORE_CATEGORIES)
+    heat_counts_by_iris = np.bincount(
+        iris_codes * n_categories + heat_codes,
+        minlength=len(iris_uniques) * n_categories
+    ).reshape(-1, n_categories)
+    heat_by_iris = pd.Series(
+        np.array(HEAT_SCORE_CATEGORIES)[heat_counts_by_iris.argmax(axis=1)],
+        index=iris_uniques
+    )
+
+    # Attach to the IRIS geometries by code lookup (IRIS without LCZ zones get no heat score)
+    city_iris_with_heat = city_iris.assign(heat_score=city_iris['code_iris'].map(heat_by_iris))
+
+    # Precompute IRIS area (IRIS GE is delivered in Lambert-93, so areas are in m²)
+    # so the app does not have to run GEOS area calls on every cold load
+    city_iris_with_heat['area_km2'] = city_iris_with_heat.to_crs(epsg=2154).geometry.area / 1_000_000
+
+    # Keep only the output columns
+    city_iris_final = city_iris_with_heat[[col for col in OUTPUT_COLUMNS if col in city_iris_with_heat.columns]]
 
     # Save to GeoJSON
     output_file = PROCESSED_DIR / f"{city_name.lower()}_iris_heat_vulnerability.geojson"
-    city_iris_final.to_file(output_file, driver='GeoJSON')
+    city_iris_final.to_file(output_file, driver='GeoJSON', engine='pyogrio')
     print(f'  ✅ Saved GeoJSON to {output_file.name}')
 
+    # Save to GeoParquet (the format the app loads first)
+    parquet_output = output_file.with_suffix('.parquet')
+    city_iris_final.to_parquet(parquet_output, index=False)
+    print(f'  ✅ Saved GeoParquet to {parquet_output.name}')
+
     # Save to CSV (without geometry)
     csv_output = PROCESSED_DIR / f"{city_name.lower()}_iris_heat_scores.csv"
     csv_data = city_iris_final.drop(columns=['geometry'])
-    csv_data.to_csv(csv_output, index=False)
+    # Arrow's C writer instead of pandas' per-cell Python formatting
+    pacsv.write_csv(pa.Table.from_pandas(csv_data, preserve_index=False), str(csv_output))
     print(f'  ✅ Saved CSV to {csv_output.name}')
 
-    # Summary statistics
+    # Summary statistics (single pass over the heat score column)
+    heat_counts = city_iris_final['heat_score'].value_counts()
     print(f'\n  📊 {city_name} Heat Score Summary:')
-    print(f'    - IRIS zones with heat data: {city_iris_final["heat_score"].notna().sum()}')
-    print(f'    - High heat zones: {(city_iris_final["heat_score"] == "High").sum()}')
-    print(f'    - Medium heat zones: {(city_iris_final["heat_score"] == "Medium").sum()}')
-    print(f'    - Low heat zones: {(city_iris_final["heat_score"] == "Low").sum()}')
+    print(f'    - IRIS zones with heat data: {heat_counts.sum()}')
+    print(f'    - High heat zones: {heat_counts.get("High", 0)}')
+    print(f'    - Medium heat zones: {heat_counts.get("Medium", 0)}')
+    print(f'    - Low heat zones: {heat_counts.get("Low", 0)}')
+
+def run_city(city_name, config, com_col, com_is_int):
+    """
+    Process a city in a worker process
+    Output is captured and returned, so the cities' logs do not interleave
+    """
+    city_log = io.StringIO()
+    with contextlib.redirect_stdout(city_log):
+        try:
+            process_city(city_name, config, com_col, com_is_int)
+        except Exception as e:
+            print(f'❌ Error processing {city_name}: {e}')
+            traceback.print_exc(file=city_log)
+    return city_log.getvalue()
 
 def main():
     """Main processing function"""
@@ -270,20 +294,25 @@ def main():
     print('PROCESSING IRIS-LEVEL HEAT SCORES FOR ALL CITIES')
     print('='*70)
 
-    # Load IRIS boundaries once
-    iris_all = load_iris_boundaries()
-    if iris_all is None:
-        print('❌ Failed to load IRIS boundaries')
+    # IRIS boundaries are read per city; only the schema is needed up front
+    print(f'📥 Loading IRIS boundaries from {IRIS_GPKG.name}...')
+    if not IRIS_GPKG.exists():
+        print(f'❌ IRIS GeoPackage not found at {IRIS_GPKG}')
+        return
+
+    com_col, com_is_int = find_commune_column()
+    if com_col is None:
+        print('❌ No commune code column found in the IRIS GeoPackage')
         return
 
-    # Process each city
-    for city_name, config in CITIES_CONFIG.items():
-        try:
-            process_city(city_name, config, iris_all)
-        except Exception as e:
-            print(f'❌ Error processing {city_name}: {e}')
-            import traceback
-            traceback.print_exc()
+    # Process the cities in parallel (independent inputs and outputs), printing each city's log in order
+    with ProcessPoolExecutor(max_workers=min(MAX_PARALLEL_CITIES, os.cpu_count() or 1)) as executor:
+        futures = [
+            executor.submit(run_city, city_name, config, com_col, com_is_int)
+            for city_name, config in CITIES_CONFIG.items()
+        ]
+        for future in futures:
+            print(future.result(), end='')
 
     print('\n'+'='*70)
     print('✅ ALL CITIES PROCESSED SUCCESSFULLY')
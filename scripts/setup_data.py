@@ -14,8 +14,12 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from config import PROCESSED_DATA_DIR, LCZ_DIR, CRS_WEB
 import geopandas as gpd
+import pyogrio
 import pandas as pd
 
+# LCZ attributes kept in the processed file (geometry is always read)
+LCZ_COLUMNS = ['identifier', 'lcz', 'hre', 'bur', 'ror', 'ver', 'vhr']
+
 def setup_processed_data():
     """
     Generate processed data files from raw data.
@@ -55,19 +59,22 @@ def setup_processed_data():
     print(f"\n📂 Loading Paris LCZ data from: {shapefile_path.name}")
     
     try:
-        # Load shapefile
-        paris_lcz = gpd.read_file(shapefile_path)
+        # Load shapefile (only the attributes kept in the output). pyogrio matches
+        # column names exactly, so resolve the layer's actual field names first
+        fields = pyogrio.read_info(shapefile_path)['fields']
+        columns = [field for field in fields if field.lower() in LCZ_COLUMNS]
+        paris_lcz = gpd.read_file(shapefile_path, engine='pyogrio', columns=columns)
         print(f"✅ Loaded {len(paris_lcz):,} zones")
         
+        # Convert column names to lowercase
+        paris_lcz.columns = paris_lcz.columns.str.lower()
+        
         # Import heat mapping
         from config import LCZ_HEAT_MAPPING
         
         # Calculate heat scores
         paris_lcz['heat_score'] = paris_lcz['lcz'].astype(str).map(LCZ_HEAT_MAPPING)
         
-        # Convert column names to lowercase
-        paris_lcz.columns = paris_lcz.columns.str.lower()
-        
         # Reproject to WGS84
         print(f"🌍 Reprojecting to {CRS_WEB}...")
         paris_lcz_web = paris_lcz.to_crs(CRS_WEB)
@@ -89,7 +96,7 @@ def setup_processed_data():
         
         # Save
         print(f"\n💾 Saving to: {paris_heat_file}")
-        paris_lcz_final.to_file(paris_heat_file, driver='GPKG')
+        paris_lcz_final.to_file(paris_heat_file, driver='GPKG', engine='pyogrio')
         
         size_mb = paris_heat_file.stat().st_size / 1_000_000
         print(f"✅ Saved successfully! Size: {size_mb:.2f} MB")